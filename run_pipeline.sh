@@ -34,5 +34,9 @@ python scripts/05_network_analysis.py
 echo " Step 6: Running full network & community analysis..."
 python scripts/06_network_deepdive.py
 
+# Step 7: Group-sequential monitoring of endline data
+echo " Step 7: Running group-sequential monitoring..."
+python scripts/07_sequential_monitoring.py
+
 echo ""
 echo " All steps complete! Check the outputs/ folder for results and visualizations."
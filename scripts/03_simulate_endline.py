@@ -1,6 +1,6 @@
 # ----------------------------------------
 # 03_simulate_endline.py
-# Step 3: Simulate Endline Survey Data
+# Step 3: Simulate Endline Survey Data (Multi-Wave Panel)
 # ----------------------------------------
 
 import pandas as pd
@@ -17,61 +17,147 @@ os.makedirs("data", exist_ok=True)
 # Set seed for reproducibility
 np.random.seed(42)
 
-# ----------------------------------------
-# Load Assigned Groups from Previous Step
+# Number of follow-up waves; wave 1 is the endline survey used downstream
+N_WAVES = 3
+
+# Long-format panel storage: one compressed, int-coded file per wave
+PANEL_DIR = "data/panel"
+
+# Group-specific uptake and post-campaign attitude parameters
+UPTAKE_PROBS = {
+    'Control': 0.50,
+    'Ad_Reason': 0.58,
+    'Ad_Emotion': 0.67
+}
+# Per-wave chance that a not-yet-vaccinated respondent gets vaccinated (waves 2+)
+CATCH_UP_PROBS = {
+    'Control': 0.05,
+    'Ad_Reason': 0.07,
+    'Ad_Emotion': 0.09
+}
+ATTITUDE_MEANS = {
+    'Control': 3.0,
+    'Ad_Reason': 3.3,
+    'Ad_Emotion': 3.6
+}
+
+# Dropout hazard per wave (logit scale): ~10% at wave 1, rising in later
+# waves; more hesitant and less engaged participants drop out more often
+DROPOUT_BASE_LOGIT = -2.2
+DROPOUT_WAVE_SLOPE = 0.3
+DROPOUT_HESITANCY_COEF = 0.25
+DROPOUT_ENGAGEMENT_COEF = 0.35
+
+# ----------------------------------------
+# Load Baseline & Assigned Groups from Previous Steps
 # ----------------------------------------
 
 assignment_df = pd.read_csv("data/assignment_data.csv")
 assignment_df["participant_id"] = assignment_df["participant_id"].str.strip()
 
-# ----------------------------------------
-# Simulate Survey Dropout
-# ----------------------------------------
+baseline_df = pd.read_csv(
+    "data/baseline_data.csv",
+    usecols=["participant_id", "vaccine_hesitancy", "ad_engagement_score"]
+)
+baseline_df["participant_id"] = baseline_df["participant_id"].str.strip()
+
+participants = assignment_df.merge(baseline_df, on="participant_id", how="left", validate="one_to_one")
+n_participants = len(participants)
+
+# Dropout hazards depend on these covariates, so they must not be imputed
+missing = participants[["vaccine_hesitancy", "ad_engagement_score"]].isnull().any(axis=1)
+assert not missing.any(), f"{missing.sum()} participants missing baseline covariates!"
 
-# Only 4,500 out of 5,000 participants respond to the endline survey
-respondents = assignment_df.sample(n=4500, random_state=42).copy()
+# Int-code the ad group once; all per-wave parameters become array lookups
+ad_groups = sorted(UPTAKE_PROBS)
+group_code = pd.Categorical(participants["ad_group"], categories=ad_groups).codes.astype(np.int8)
+assert (group_code >= 0).all(), "Unknown ad_group values in assignment data!"
+uptake_probs = np.array([UPTAKE_PROBS[g] for g in ad_groups])[group_code]
+catch_up_probs = np.array([CATCH_UP_PROBS[g] for g in ad_groups])[group_code]
+attitude_means = np.array([ATTITUDE_MEANS[g] for g in ad_groups])[group_code]
+
+hesitancy = participants["vaccine_hesitancy"].to_numpy(dtype=float)
+engagement = participants["ad_engagement_score"].to_numpy(dtype=float)
 
 # ----------------------------------------
-# Simulate Vaccine Uptake by Ad Group
+# Simulate Multi-Wave Panel with Covariate-Dependent Attrition
 # ----------------------------------------
 
-def simulate_vaccine_uptake(group: str) -> int:
+def dropout_hazard(wave: int) -> np.ndarray:
     """
-    Simulate vaccine uptake (1 = vaccinated, 0 = not) 
-    using group-specific probabilities.
+    Probability of dropping out at `wave` (1-based) for each participant
+    still in the panel, driven by baseline hesitancy and engagement.
     """
-    uptake_probs = {
-        'Control': 0.50,
-        'Ad_Reason': 0.58,
-        'Ad_Emotion': 0.67
-    }
-    return np.random.binomial(1, uptake_probs[group])
+    logit = (
+        DROPOUT_BASE_LOGIT
+        + DROPOUT_WAVE_SLOPE * (wave - 1)
+        + DROPOUT_HESITANCY_COEF * (hesitancy - 3)
+        - DROPOUT_ENGAGEMENT_COEF * (engagement - 3)
+    )
+    return 1 / (1 + np.exp(-logit))
 
-respondents["vaccine_uptake"] = respondents["ad_group"].apply(simulate_vaccine_uptake)
 
-# ----------------------------------------
-# Simulate Post-Campaign Attitude Score
-# ----------------------------------------
-
-def simulate_post_attitude(group: str) -> int:
+def simulate_panel(n_waves: int):
     """
-    Simulate post-campaign attitude score (1–5) using 
-    group-specific mean and clipped normal distribution.
+    Yield (wave, respondent_index, vaccine_uptake, post_attitude_score) for
+    each wave. Attrition is monotone (dropouts never return) and uptake is
+    absorbing. Every step is vectorized over all participants.
     """
-    mean_scores = {
-        'Control': 3.0,
-        'Ad_Reason': 3.3,
-        'Ad_Emotion': 3.6
-    }
-    score = np.random.normal(loc=mean_scores[group], scale=1.0)
-    return int(round(np.clip(score, 1, 5)))
+    active = np.ones(n_participants, dtype=bool)
+    vaccinated = np.zeros(n_participants, dtype=bool)
+
+    for wave in range(1, n_waves + 1):
+        active &= np.random.random(n_participants) >= dropout_hazard(wave)
 
-respondents["post_attitude_score"] = respondents["ad_group"].apply(simulate_post_attitude)
+        probs = uptake_probs if wave == 1 else catch_up_probs
+        vaccinated |= active & (np.random.random(n_participants) < probs)
+
+        attitude = np.clip(np.rint(np.random.normal(attitude_means, 1.0)), 1, 5).astype(np.int8)
+
+        idx = np.flatnonzero(active).astype(np.int32)
+        yield wave, idx, vaccinated[idx].astype(np.int8), attitude[idx]
+
+
+assert N_WAVES >= 1, "At least one follow-up wave is required (wave 1 is the endline survey)."
+
+os.makedirs(PANEL_DIR, exist_ok=True)
+
+# Codebook shared by every wave file: row index -> participant_id, code -> ad_group
+np.savez_compressed(
+    os.path.join(PANEL_DIR, "codebook.npz"),
+    participant_id=participants["participant_id"].to_numpy(dtype=str),
+    ad_group=np.array(ad_groups),
+    n_waves=N_WAVES
+)
+
+print("\n📊 Panel Retention by Wave:")
+for wave, idx, uptake, attitude in simulate_panel(N_WAVES):
+    np.savez_compressed(
+        os.path.join(PANEL_DIR, f"wave_{wave:02d}.npz"),
+        participant_idx=idx,
+        ad_group=group_code[idx],
+        vaccine_uptake=uptake,
+        post_attitude_score=attitude
+    )
+    print(f"Wave {wave}: {len(idx)} respondents ({len(idx) / n_participants:.1%}), uptake = {uptake.mean():.3f}")
+
+    if wave == 1:
+        endline_wave = (idx, uptake, attitude)
 
 # ----------------------------------------
 # Build Final Endline Dataset
 # ----------------------------------------
 
+# Wave 1 is the endline survey; rows are shuffled to mimic arrival order
+idx, uptake, attitude = endline_wave
+order = np.random.permutation(len(idx))
+respondents = pd.DataFrame({
+    "participant_id": participants["participant_id"].to_numpy()[idx[order]],
+    "ad_group": participants["ad_group"].to_numpy()[idx[order]],
+    "vaccine_uptake": uptake[order],
+    "post_attitude_score": attitude[order]
+})
+
 # Include ad_group for transparency and analysis
 endline_df = respondents[["participant_id", "ad_group", "vaccine_uptake", "post_attitude_score"]]
 
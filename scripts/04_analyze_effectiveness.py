@@ -25,6 +25,13 @@ EXPOSURE_RATES = {
     "Control": 0.0
 }
 
+# Multi-wave panel written by step 3
+PANEL_DIR = "data/panel"
+
+# Bootstrap settings for the complier-effect (IV) standard errors
+BOOTSTRAP_REPS = 2000
+BOOTSTRAP_BATCH = 500
+
 # Set style
 sns.set(style="whitegrid")
 np.random.seed(42)
@@ -60,7 +67,9 @@ merged.to_csv("outputs/merged_full_data.csv", index=False)
 # Simulate Campaign Exposure (Reach)
 # ----------------------------------------
 
-merged["ad_exposed"] = merged["ad_group"].apply(lambda g: np.random.binomial(1, EXPOSURE_RATES[g]))
+# One vectorized Bernoulli draw per participant using the group's reach rate
+exposure_probs = merged["ad_group"].map(EXPOSURE_RATES).to_numpy(dtype=float)
+merged["ad_exposed"] = np.random.binomial(1, exposure_probs).astype(np.int8)
 
 # ----------------------------------------
 # ITT & TOT Summary
@@ -72,31 +81,146 @@ summary_itt.columns = ["ad_group", "total", "vaccinated", "vaccination_rate"]
 summary_itt["type"] = "ITT"
 summary_itt.to_csv("outputs/vaccination_summary_itt.csv", index=False)
 
-# TOT: only exposed participants
+# Exposed-only (naive): uptake among exposed participants. This compares
+# self-selected viewers with an unexposed Control arm, so it is biased as a
+# TOT estimate; the Wald/2SLS estimate below is the TOT used for inference
 tot_df = merged[merged["ad_exposed"] == 1]
 summary_tot = tot_df.groupby("ad_group")["vaccine_uptake"].agg(["count", "sum", "mean"]).reset_index()
 summary_tot.columns = ["ad_group", "exposed_total", "vaccinated", "vaccination_rate"]
-summary_tot["type"] = "TOT"
+summary_tot["type"] = "Exposed_only"
 summary_tot.to_csv("outputs/vaccination_summary_tot.csv", index=False)
 
-# Combine for plotting
+print("\n✅ ITT and TOT analysis complete.")
+
+# ----------------------------------------
+# Complier Effect (Wald / 2SLS, assignment as instrument)
+# ----------------------------------------
+
+# Filtering to exposed rows compares self-selected viewers against an
+# unexposed Control arm. Instead, instrument exposure with random assignment:
+#   TOT = (ITT on uptake) / (ITT on exposure)
+# Control has zero exposure by design, so the complier effect equals the TOT.
+
+def arm_cell_counts(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Count participants per (ad_group, ad_exposed, vaccine_uptake) cell.
+    This single pass is the only work proportional to the number of rows.
+    """
+    return (
+        df.groupby(["ad_group", "ad_exposed", "vaccine_uptake"], observed=True)
+        .size()
+        .unstack(["ad_exposed", "vaccine_uptake"], fill_value=0)
+        .reindex(columns=pd.MultiIndex.from_product([[0, 1], [0, 1]]), fill_value=0)
+    )
+
+def wald_from_cells(treat_cells: np.ndarray, control_cells: np.ndarray):
+    """
+    Wald/2SLS estimate and heteroskedasticity-robust SE from cell counts.
+    Cells are ordered (D=0,Y=0), (D=0,Y=1), (D=1,Y=0), (D=1,Y=1) along the
+    last axis, so batches of bootstrap replicates can be passed at once.
+    """
+    d = np.array([0, 0, 1, 1])
+    y = np.array([0, 1, 0, 1])
+    n_t = treat_cells.sum(axis=-1)
+    n_c = control_cells.sum(axis=-1)
+
+    itt_y = (treat_cells @ y) / n_t - (control_cells @ y) / n_c
+    first_stage = (treat_cells @ d) / n_t - (control_cells @ d) / n_c
+    late = itt_y / first_stage
+
+    # Influence function of the Wald ratio: residual u = Y - LATE * D per arm
+    u = y - np.multiply.outer(late, d)
+    var_t = (treat_cells * u ** 2).sum(axis=-1) / n_t - ((treat_cells * u).sum(axis=-1) / n_t) ** 2
+    var_c = (control_cells * u ** 2).sum(axis=-1) / n_c - ((control_cells * u).sum(axis=-1) / n_c) ** 2
+    se = np.sqrt(var_t / n_t + var_c / n_c) / np.abs(first_stage)
+    return late, se, itt_y, first_stage
+
+def bootstrap_wald(treat_cells: np.ndarray, control_cells: np.ndarray,
+                   n_boot: int = BOOTSTRAP_REPS, batch_size: int = BOOTSTRAP_BATCH) -> np.ndarray:
+    """
+    Stratified nonparametric bootstrap of the Wald estimate.
+    Resampling rows with replacement within an arm is a multinomial draw over
+    its four (D, Y) cells, so each replicate costs O(1) regardless of arm size.
+    """
+    draws = []
+    for start in range(0, n_boot, batch_size):
+        size = min(batch_size, n_boot - start)
+        t = np.random.multinomial(treat_cells.sum(), treat_cells / treat_cells.sum(), size=size)
+        c = np.random.multinomial(control_cells.sum(), control_cells / control_cells.sum(), size=size)
+        draws.append(wald_from_cells(t, c)[0])
+    return np.concatenate(draws)
+
+cells = arm_cell_counts(merged)
+control_cells = cells.loc["Control"].to_numpy()
+
+iv_rows = []
+for group in [g for g in cells.index if g != "Control"]:
+    treat_cells = cells.loc[group].to_numpy()
+    late, se, itt_y, first_stage = wald_from_cells(treat_cells, control_cells)
+    boot = bootstrap_wald(treat_cells, control_cells)
+    boot = boot[np.isfinite(boot)]
+    ci_low, ci_high = np.percentile(boot, [2.5, 97.5])
+    iv_rows.append({
+        "ad_group": group,
+        "n_assigned": int(treat_cells.sum()),
+        "n_control": int(control_cells.sum()),
+        "itt_effect": itt_y,
+        "first_stage": first_stage,
+        "tot_effect": late,
+        "tot_se_analytic": se,
+        "tot_p_value": 2 * stats.norm.sf(abs(late / se)),
+        "tot_se_bootstrap": boot.std(ddof=1),
+        "tot_ci_low_bootstrap": ci_low,
+        "tot_ci_high_bootstrap": ci_high,
+    })
+
+summary_iv = pd.DataFrame(iv_rows)
+summary_iv["type"] = "TOT_IV"
+summary_iv.to_csv("outputs/vaccination_summary_tot_iv.csv", index=False)
+
+print("\n📊 Complier Effect (Wald/2SLS, assignment as instrument):")
+print(summary_iv[["ad_group", "itt_effect", "first_stage", "tot_effect", "tot_se_analytic", "tot_se_bootstrap"]])
+
+# ----------------------------------------
+# ITT vs TOT Plot
+# ----------------------------------------
+
+# Left: uptake rates by arm (ITT vs naive exposed-only)
 compare_df = pd.concat([
     summary_itt[["ad_group", "vaccination_rate", "type"]],
-    summary_tot[["ad_group", "vaccination_rate", "type"]]
+    summary_tot[["ad_group", "vaccination_rate", "type"]].assign(type="Exposed-only (naive)")
 ])
 
-# Plot ITT vs TOT comparison
-plt.figure(figsize=(8, 5))
-sns.barplot(data=compare_df, x="ad_group", y="vaccination_rate", hue="type", palette="Set2")
-plt.title("Intention-to-Treat vs Treatment-on-the-Treated")
-plt.ylabel("Vaccination Rate")
-plt.ylim(0, 1)
+# Right: effects vs Control (ITT vs Wald/2SLS TOT with bootstrap 95% CI)
+effect_df = summary_iv.set_index("ad_group")
+positions = np.arange(len(effect_df))
+
+fig, axes = plt.subplots(1, 2, figsize=(13, 5))
+sns.barplot(ax=axes[0], data=compare_df, x="ad_group", y="vaccination_rate", hue="type", palette="Set2")
+axes[0].set_title("Vaccination Rate: ITT vs Exposed-only (naive)")
+axes[0].set_ylabel("Vaccination Rate")
+axes[0].set_xlabel("ad_group")
+axes[0].set_ylim(0, 1)
+
+axes[1].bar(positions - 0.2, effect_df["itt_effect"], width=0.4, color="#66c2a5", label="ITT effect")
+axes[1].bar(
+    positions + 0.2, effect_df["tot_effect"], width=0.4, color="#fc8d62", label="TOT (Wald/2SLS)",
+    yerr=[effect_df["tot_effect"] - effect_df["tot_ci_low_bootstrap"],
+          effect_df["tot_ci_high_bootstrap"] - effect_df["tot_effect"]],
+    capsize=6
+)
+axes[1].set_xticks(positions)
+axes[1].set_xticklabels(effect_df.index)
+axes[1].axhline(0, color="gray", linewidth=0.8)
+axes[1].set_title("Effect vs Control: ITT vs Treatment-on-the-Treated")
+axes[1].set_ylabel("Difference in Vaccination Rate")
+axes[1].set_xlabel("ad_group")
+axes[1].legend()
+
 plt.tight_layout()
 plt.savefig("outputs/itt_vs_tot_comparison.png")
 plt.close()
 
-print("\n✅ ITT and TOT analysis complete.")
-
 # ----------------------------------------
 # Vaccine Uptake Summary Table (General)
 # ----------------------------------------
@@ -215,6 +339,46 @@ with open("outputs/logistic_summary.txt", "w") as f:
     f.write(logit_model.summary().as_text())
     f.write(f"\n\nPseudo R²: {pseudo_r2:.4f}")
 
+# ----------------------------------------
+# Panel Uptake by Wave (Multi-Wave Follow-Up)
+# ----------------------------------------
+
+# Wave files are scanned one at a time, so the full panel is never in memory
+panel_summary = None
+codebook_path = os.path.join(PANEL_DIR, "codebook.npz")
+
+if os.path.exists(codebook_path):
+    with np.load(codebook_path) as codebook:
+        panel_groups = codebook["ad_group"]
+        n_waves = int(codebook["n_waves"])
+    assigned_counts = np.bincount(
+        pd.Categorical(assignment["ad_group"], categories=panel_groups).codes,
+        minlength=len(panel_groups)
+    )
+
+    panel_rows = []
+    for wave in range(1, n_waves + 1):
+        with np.load(os.path.join(PANEL_DIR, f"wave_{wave:02d}.npz")) as wave_data:
+            codes = wave_data["ad_group"]
+            respondents_by_group = np.bincount(codes, minlength=len(panel_groups))
+            vaccinated_by_group = np.bincount(codes, weights=wave_data["vaccine_uptake"], minlength=len(panel_groups))
+
+        for g, group in enumerate(panel_groups):
+            panel_rows.append({
+                "wave": wave,
+                "ad_group": group,
+                "respondents": int(respondents_by_group[g]),
+                "retention_rate": respondents_by_group[g] / max(assigned_counts[g], 1),
+                "vaccination_rate": vaccinated_by_group[g] / max(respondents_by_group[g], 1)
+            })
+
+    panel_summary = pd.DataFrame(panel_rows)
+    panel_summary.to_csv("outputs/panel_uptake_by_wave.csv", index=False)
+    print("\n📊 Panel Uptake by Wave:")
+    print(panel_summary)
+else:
+    print("\n⚠️ Skipping panel wave analysis — no panel found in data/panel.")
+
 # ----------------------------------------
 # Summary Report
 # ----------------------------------------
@@ -227,6 +391,8 @@ with open("outputs/summary_report.txt", "w") as f:
         f.write(attitude_summary.to_string(index=False))
     else:
         f.write("Skipped — baseline or post-campaign scores missing.\n")
+    f.write("\n\n=== Complier Effect (Wald/2SLS) ===\n")
+    f.write(summary_iv.drop(columns="type").to_string(index=False))
     f.write(f"\n\n=== Chi-Square Test ===\nChi2 = {chi2:.2f}, p = {p:.4f}, dof = {dof}\n")
     f.write(f"\n\n=== Logistic Regression Pseudo R² ===\nPseudo R² = {pseudo_r2:.4f}\n")
 
@@ -5,11 +5,18 @@
 
 import pandas as pd
 import networkx as nx
+import matplotlib
 import matplotlib.pyplot as plt
 import seaborn as sns
+import numpy as np
 import os
+import hashlib
 import random
+import scipy.sparse as sp
+from scipy.ndimage import gaussian_filter
+from scipy.sparse.linalg import eigsh
 from scipy.stats import ttest_ind
+from matplotlib.patches import Patch
 from networkx.algorithms.community import greedy_modularity_communities
 
 # ----------------------------------------
@@ -19,6 +26,25 @@ from networkx.algorithms.community import greedy_modularity_communities
 # Create outputs folder
 os.makedirs("outputs", exist_ok=True)
 
+# Network rendering: a random 100-node subnetwork is always drawn; when
+# enabled, the full graph is also rasterized from a cached layout
+RENDER_NETWORK_RASTER = True
+
+# Raster rendering settings
+LAYOUT_CACHE = "outputs/network_layout_cache.npz"
+LAYOUT_VERSION = 2          # Bump when compute_layout changes to invalidate the cache
+LAYOUT_ITERATIONS = 50
+LAYOUT_GRID = 256           # Grid resolution for the density-based repulsion
+RASTER_SIZE = 1000          # Output image is RASTER_SIZE x RASTER_SIZE pixels
+EDGE_SAMPLES = 16           # Points sampled along each edge when rasterizing
+EDGE_CHUNK = 200_000        # Edges rasterized per batch to bound memory
+NODE_BLUR = 2.0             # Gaussian splat radius (pixels) for the node layer
+RASTER_COLOR_COLUMNS = ["vaccine_uptake", "community_id"]
+UPTAKE_COLORS = {0: "#d62728", 1: "#1f77b4"}   # Not vaccinated: red, vaccinated: blue
+
+random.seed(42)
+np.random.seed(42)
+
 # Load merged participant data
 merged = pd.read_csv("outputs/merged_full_data.csv")
 n = len(merged)
@@ -111,23 +137,217 @@ plt.savefig("outputs/network_vaccine_uptake_by_community.png")
 plt.close()
 
 # ----------------------------------------
-# Sample Network Visualization
+# Network Visualization Helpers
+# ----------------------------------------
+
+def build_sparse_adjacency(G: nx.Graph, node_order) -> sp.csr_matrix:
+    """
+    Build a symmetric CSR adjacency matrix with rows in `node_order`.
+    """
+    index = pd.Index(node_order)
+    n_edges = G.number_of_edges()
+    sources = index.get_indexer(np.fromiter((u for u, _ in G.edges()), dtype=object, count=n_edges))
+    targets = index.get_indexer(np.fromiter((v for _, v in G.edges()), dtype=object, count=n_edges))
+    rows = np.concatenate([sources, targets])
+    cols = np.concatenate([targets, sources])
+    data = np.ones(len(rows), dtype=np.float32)
+    return sp.csr_matrix((data, (rows, cols)), shape=(len(node_order), len(node_order)))
+
+
+def compute_layout(adj: sp.csr_matrix, n_iter: int = LAYOUT_ITERATIONS, grid: int = LAYOUT_GRID) -> np.ndarray:
+    """
+    Scalable 2D layout for large sparse graphs.
+
+    Starts from a spectral embedding (two leading non-trivial eigenvectors of
+    the normalized adjacency), then refines it with a force-directed pass:
+    attraction pulls each node towards its neighbours' centroid via one sparse
+    mat-vec, and repulsion pushes nodes down the gradient of a gridded node
+    density (particle-mesh), so every iteration is O(nodes + edges).
+    """
+    degree = np.asarray(adj.sum(axis=1)).ravel()
+    inv_sqrt = np.zeros_like(degree)
+    inv_sqrt[degree > 0] = 1.0 / np.sqrt(degree[degree > 0])
+    norm_adj = sp.diags(inv_sqrt) @ adj @ sp.diags(inv_sqrt)
+
+    # Seeded start vector and a fixed sign per eigenvector keep the layout
+    # reproducible (ARPACK otherwise picks its own random start)
+    rng = np.random.default_rng(42)
+    _, vecs = eigsh(norm_adj, k=3, which="LA", v0=rng.random(adj.shape[0]))
+    vecs = vecs[:, :2]
+    vecs *= np.sign(vecs[np.abs(vecs).argmax(axis=0), [0, 1]])
+    pos = vecs * inv_sqrt[:, None]
+    pos += rng.normal(scale=1e-3 * (pos.std() + 1e-12), size=pos.shape)
+
+    inv_degree = np.zeros_like(degree)
+    inv_degree[degree > 0] = 1.0 / degree[degree > 0]
+
+    for step in range(n_iter):
+        # Rescale to the unit square so forces are comparable across graphs
+        pos = (pos - pos.min(axis=0)) / (np.ptp(pos, axis=0) + 1e-12)
+
+        attraction = (adj @ pos) * inv_degree[:, None] - pos
+        attraction[degree == 0] = 0.0
+
+        density, _, _ = np.histogram2d(pos[:, 0], pos[:, 1], bins=grid, range=[[0, 1], [0, 1]])
+        grad_x, grad_y = np.gradient(density / max(density.mean(), 1e-12))
+        cell = np.clip((pos * grid).astype(int), 0, grid - 1)
+        repulsion = -np.column_stack([grad_x[cell[:, 0], cell[:, 1]], grad_y[cell[:, 0], cell[:, 1]]]) / grid
+
+        temperature = 0.1 * (1 - step / n_iter)
+        pos = pos + temperature * (attraction + repulsion)
+
+    return (pos - pos.min(axis=0)) / (np.ptp(pos, axis=0) + 1e-12)
+
+
+def layout_cache_key(adj: sp.csr_matrix, node_ids: np.ndarray) -> str:
+    """
+    Fingerprint of the graph structure, node order and layout parameters.
+    """
+    adj = adj.tocsr()
+    adj.sort_indices()
+    digest = hashlib.sha256()
+    digest.update(np.asarray(adj.indptr, dtype=np.int64).tobytes())
+    digest.update(np.asarray(adj.indices, dtype=np.int64).tobytes())
+    digest.update("\n".join(node_ids).encode())
+    digest.update(f"v{LAYOUT_VERSION}|iter={LAYOUT_ITERATIONS}|grid={LAYOUT_GRID}".encode())
+    return digest.hexdigest()
+
+
+def load_or_compute_layout(adj: sp.csr_matrix, node_ids, cache_path: str = LAYOUT_CACHE) -> np.ndarray:
+    """
+    Reuse the cached layout if it was computed for the same graph and
+    layout parameters.
+    """
+    node_ids = np.asarray(node_ids, dtype=str)
+    key = layout_cache_key(adj, node_ids)
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cache:
+            if str(cache["cache_key"]) == key:
+                print(f"♻️ Reusing cached network layout from {cache_path}")
+                return cache["positions"]
+
+    print("🧭 Computing full-network layout (cached for later renders)...")
+    positions = compute_layout(adj)
+    np.savez(cache_path, cache_key=key, positions=positions)
+    return positions
+
+
+def node_colors(values: pd.Series) -> np.ndarray:
+    """
+    Map a node attribute to RGB: fixed colours for vaccine uptake, categorical
+    palette for community IDs, continuous colormap otherwise.
+    """
+    if values.name == "vaccine_uptake":
+        palette = np.array([matplotlib.colors.to_rgb(UPTAKE_COLORS[k]) for k in (0, 1)])
+        return palette[values.to_numpy(dtype=int)]
+    if values.name == "community_id":
+        return plt.get_cmap("tab20")(values.to_numpy().astype(int) % 20)[:, :3]
+    vals = values.to_numpy(dtype=float)
+    scaled = (vals - vals.min()) / (np.ptp(vals) + 1e-12)
+    return plt.get_cmap("viridis")(scaled)[:, :3]
+
+
+def add_color_key(values: pd.Series) -> None:
+    """
+    Explain the node colours on the current raster figure.
+    """
+    if values.name == "vaccine_uptake":
+        handles = [Patch(color=UPTAKE_COLORS[1], label="Vaccinated"),
+                   Patch(color=UPTAKE_COLORS[0], label="Not vaccinated")]
+        plt.legend(handles=handles, loc="lower right", frameon=True)
+    elif values.name == "community_id":
+        plt.figtext(0.5, 0.02,
+                    f"Node colour = community ({values.nunique()} communities, tab20 palette "
+                    "repeating every 20 IDs); grey = edge density",
+                    ha="center", fontsize=9)
+    else:
+        mappable = plt.cm.ScalarMappable(
+            norm=matplotlib.colors.Normalize(values.min(), values.max()), cmap="viridis"
+        )
+        plt.colorbar(mappable, ax=plt.gca(), shrink=0.6, label=values.name)
+
+
+def rasterize_network(adj: sp.csr_matrix, positions: np.ndarray, colors: np.ndarray,
+                      size: int = RASTER_SIZE) -> np.ndarray:
+    """
+    Rasterize edges and nodes into an RGB density image.
+
+    Edges are accumulated as sampled points into a log-scaled grey density
+    layer; nodes are splatted with a small Gaussian and blended per pixel by
+    averaging their colours, with opacity from the log local node density.
+    """
+    extent = [[0, 1], [0, 1]]
+
+    upper = sp.triu(adj, k=1).tocoo()
+    t = np.linspace(0, 1, EDGE_SAMPLES)[None, :]
+    edge_density = np.zeros((size, size))
+    for start in range(0, upper.nnz, EDGE_CHUNK):
+        src = positions[upper.row[start:start + EDGE_CHUNK]]
+        dst = positions[upper.col[start:start + EDGE_CHUNK]]
+        xs = src[:, :1] + t * (dst[:, :1] - src[:, :1])
+        ys = src[:, 1:] + t * (dst[:, 1:] - src[:, 1:])
+        chunk, _, _ = np.histogram2d(xs.ravel(), ys.ravel(), bins=size, range=extent)
+        edge_density += chunk
+
+    node_count, _, _ = np.histogram2d(positions[:, 0], positions[:, 1], bins=size, range=extent)
+    node_rgb = np.stack([
+        np.histogram2d(positions[:, 0], positions[:, 1], bins=size, range=extent, weights=colors[:, c])[0]
+        for c in range(3)
+    ], axis=-1)
+    node_count = gaussian_filter(node_count, NODE_BLUR)
+    node_rgb = gaussian_filter(node_rgb, (NODE_BLUR, NODE_BLUR, 0))
+    node_rgb /= np.maximum(node_count, 1e-12)[..., None]
+
+    edge_layer = np.log1p(edge_density) / max(np.log1p(edge_density).max(), 1e-12)
+    node_alpha = np.log1p(node_count) / max(np.log1p(node_count).max(), 1e-12)
+
+    background = 1.0 - 0.6 * edge_layer[..., None]
+    image = background * (1 - node_alpha[..., None]) + node_rgb * node_alpha[..., None]
+
+    # histogram2d returns [x, y]; transpose so imshow puts x on the horizontal axis
+    return np.transpose(image, (1, 0, 2))
+
+
+# ----------------------------------------
+# Network Visualization
 # ----------------------------------------
 
 # Draw a sample of 100 nodes from the network
-sample_nodes = random.sample(list(G.nodes()), 100)
-subG = G.subgraph(sample_nodes)
+# Nodes and edges are added in sorted order so the drawing does not depend
+# on string hashing (subgraph views iterate the sample as a set)
+sample_nodes = sorted(random.sample(list(G.nodes()), 100))
+subG = nx.Graph()
+subG.add_nodes_from(sample_nodes)
+subG.add_edges_from(sorted(tuple(sorted(e)) for e in G.subgraph(sample_nodes).edges()))
 
 # Color nodes by vaccine uptake
 colors = ["skyblue" if G.nodes[n]["vaccine_uptake"] == 1 else "lightgray" for n in subG.nodes()]
 
 plt.figure(figsize=(10, 8))
-nx.draw(subG, with_labels=False, node_size=50, node_color=colors)
+nx.draw(subG, pos=nx.spring_layout(subG, seed=42), with_labels=False, node_size=50, node_color=colors)
 plt.title("Vaccination Uptake in Random Subnetwork")
 plt.tight_layout()
 plt.savefig("outputs/network_graph_sample.png")
 plt.close()
 
+if RENDER_NETWORK_RASTER:
+    # Full-graph density rendering: one cached layout, one image per coloring
+    node_order = merged["participant_id"].tolist()
+    adjacency = build_sparse_adjacency(G, node_order)
+    positions = load_or_compute_layout(adjacency, node_order)
+
+    for column in RASTER_COLOR_COLUMNS:
+        image = rasterize_network(adjacency, positions, node_colors(merged[column]))
+
+        plt.figure(figsize=(10, 10))
+        plt.imshow(image, origin="lower", interpolation="nearest")
+        plt.axis("off")
+        plt.title(f"Full Network Density Colored by {column}")
+        add_color_key(merged[column])
+        plt.tight_layout(rect=[0, 0.04, 1, 1])
+        plt.savefig(f"outputs/network_raster_{column}.png", dpi=150)
+        plt.close()
+
 # ----------------------------------------
 # Done
 # ----------------------------------------
@@ -138,3 +358,5 @@ print("• Centrality boxplot")
 print("• T-test results")
 print("• Community uptake histogram")
 print("• Subnetwork visualization")
+if RENDER_NETWORK_RASTER:
+    print("• Full-network raster images")
@@ -0,0 +1,234 @@
+# ----------------------------------------
+# 07_sequential_monitoring.py
+# Step 7: Group-Sequential Monitoring of Endline Data
+# ----------------------------------------
+
+import pandas as pd
+import numpy as np
+import scipy.stats as stats
+from scipy.optimize import brentq
+import os
+
+# ----------------------------------------
+# Setup & Constants
+# ----------------------------------------
+
+# Create output folder
+os.makedirs("outputs", exist_ok=True)
+
+# Planned interim looks (equally spaced in information) and overall alpha
+N_LOOKS = 5
+ALPHA = 0.05
+
+# Alpha-spending function: "obrien_fleming" or "pocock" (Lan-DeMets forms)
+SPENDING_FUNCTION = "obrien_fleming"
+
+# Each ad arm is compared against Control; alpha is split across comparisons
+CONTROL_GROUP = "Control"
+TREATMENT_GROUPS = ["Ad_Reason", "Ad_Emotion"]
+
+# ----------------------------------------
+# Alpha-Spending Boundaries
+# ----------------------------------------
+
+def alpha_spent(t: np.ndarray, alpha: float, kind: str) -> np.ndarray:
+    """
+    Cumulative two-sided alpha spent at information fraction t (0 < t <= 1).
+    """
+    t = np.asarray(t, dtype=float)
+    if kind == "obrien_fleming":
+        return 2 - 2 * stats.norm.cdf(stats.norm.ppf(1 - alpha / 2) / np.sqrt(t))
+    if kind == "pocock":
+        return alpha * np.log(1 + (np.e - 1) * t)
+    raise ValueError(f"Unknown spending function: {kind}")
+
+
+def group_sequential_boundaries(info_fractions, alpha: float, kind: str, grid_size: int = 2000) -> np.ndarray:
+    """
+    Two-sided critical values c_k such that P(first |Z_k| >= c_k at look k)
+    equals the alpha spent between looks k-1 and k under H0.
+
+    Uses the standard recursive numerical integration over the score process
+    B(t) ~ N(0, t) with independent increments (Armitage-McPherson-Rowe).
+    Boundaries depend only on the look schedule, so they are computed once
+    before monitoring starts.
+    """
+    t = np.asarray(info_fractions, dtype=float)
+    spend = np.diff(np.concatenate([[0.0], alpha_spent(t, alpha, kind)]))
+
+    boundaries = np.empty(len(t))
+    boundaries[0] = stats.norm.isf(spend[0] / 2)
+
+    # Sub-density of B(t_1) on the continuation region, with trapezoid weights
+    half_width = boundaries[0] * np.sqrt(t[0])
+    grid = np.linspace(-half_width, half_width, grid_size)
+    weights = np.full(grid_size, grid[1] - grid[0])
+    weights[[0, -1]] /= 2
+    density = stats.norm.pdf(grid, scale=np.sqrt(t[0]))
+
+    for k in range(1, len(t)):
+        step_sd = np.sqrt(t[k] - t[k - 1])
+        mass = weights * density
+
+        def crossing_prob(c):
+            edge = c * np.sqrt(t[k])
+            upper = stats.norm.sf((edge - grid) / step_sd)
+            lower = stats.norm.cdf((-edge - grid) / step_sd)
+            return np.sum(mass * (upper + lower))
+
+        if spend[k] <= 0:
+            boundaries[k] = np.inf
+        else:
+            boundaries[k] = brentq(lambda c: crossing_prob(c) - spend[k], 1e-6, 40)
+
+        # Propagate the continuation-region density to the next look
+        half_width = min(boundaries[k], 40) * np.sqrt(t[k])
+        new_grid = np.linspace(-half_width, half_width, grid_size)
+        kernel = stats.norm.pdf((new_grid[:, None] - grid[None, :]) / step_sd) / step_sd
+        density = kernel @ mass
+        grid = new_grid
+        weights = np.full(grid_size, grid[1] - grid[0])
+        weights[[0, -1]] /= 2
+
+    return boundaries
+
+# ----------------------------------------
+# Running Sufficient Statistics
+# ----------------------------------------
+
+class SequentialMonitor:
+    """
+    Keep per-group respondent counts and vaccination counts as data arrive.
+    Updating costs O(batch size); each interim look only reads the 2 x groups
+    table of counts, so it costs O(1) however many respondents have arrived.
+    """
+
+    def __init__(self, groups):
+        self.groups = list(groups)
+        self.n = np.zeros(len(self.groups), dtype=np.int64)
+        self.vaccinated = np.zeros(len(self.groups), dtype=np.int64)
+
+    def update(self, batch: pd.DataFrame) -> None:
+        codes = pd.Categorical(batch["ad_group"], categories=self.groups).codes
+        keep = codes >= 0
+        self.n += np.bincount(codes[keep], minlength=len(self.groups))
+        self.vaccinated += np.bincount(
+            codes[keep], weights=batch["vaccine_uptake"].to_numpy()[keep], minlength=len(self.groups)
+        ).astype(np.int64)
+
+    def z_statistic(self, treatment: str, control: str) -> float:
+        """
+        Pooled two-proportion z statistic (treatment minus control).
+        """
+        i, j = self.groups.index(treatment), self.groups.index(control)
+        n_t, n_c = self.n[i], self.n[j]
+        if n_t == 0 or n_c == 0:
+            return np.nan
+        p_t, p_c = self.vaccinated[i] / n_t, self.vaccinated[j] / n_c
+        p_pool = (self.vaccinated[i] + self.vaccinated[j]) / (n_t + n_c)
+        se = np.sqrt(p_pool * (1 - p_pool) * (1 / n_t + 1 / n_c))
+        return (p_t - p_c) / se if se > 0 else np.nan
+
+    def chi_square(self) -> tuple:
+        """
+        Pearson chi-square for uptake across all groups from the running table.
+        """
+        observed = np.vstack([self.n - self.vaccinated, self.vaccinated])
+        expected = observed.sum(axis=1, keepdims=True) * self.n / self.n.sum()
+        chi2 = np.sum((observed - expected) ** 2 / np.where(expected > 0, expected, np.nan))
+        dof = len(self.groups) - 1
+        return chi2, stats.chi2.sf(chi2, dof)
+
+# ----------------------------------------
+# Load Endline Data (in arrival order)
+# ----------------------------------------
+
+try:
+    endline = pd.read_csv("data/endline_data.csv")
+except FileNotFoundError as e:
+    print(f"❌ Missing file: {e}")
+    exit(1)
+
+# Row order of the endline file is treated as the order responses arrive
+n_total = len(endline)
+info_fractions = np.arange(1, N_LOOKS + 1) / N_LOOKS
+look_sizes = np.round(info_fractions * n_total).astype(int)
+
+# Bonferroni split of alpha across the arm-vs-control comparisons
+alpha_per_comparison = ALPHA / len(TREATMENT_GROUPS)
+boundaries = group_sequential_boundaries(info_fractions, alpha_per_comparison, SPENDING_FUNCTION)
+cumulative_alpha = alpha_spent(info_fractions, alpha_per_comparison, SPENDING_FUNCTION)
+
+print(f"\n📐 {SPENDING_FUNCTION} boundaries (alpha = {alpha_per_comparison:.4f} per comparison):")
+for k, c in enumerate(boundaries, start=1):
+    print(f"Look {k}: t = {info_fractions[k - 1]:.2f}, |z| >= {c:.3f}")
+
+# ----------------------------------------
+# Interim Looks
+# ----------------------------------------
+
+monitor = SequentialMonitor([CONTROL_GROUP] + TREATMENT_GROUPS)
+stopped = {g: None for g in TREATMENT_GROUPS}
+report_rows = []
+previous = 0
+
+for k, size in enumerate(look_sizes):
+    # Only the newly arrived batch is touched between looks
+    monitor.update(endline.iloc[previous:size])
+    previous = size
+    chi2, chi2_p = monitor.chi_square()
+
+    for group in TREATMENT_GROUPS:
+        z = monitor.z_statistic(group, CONTROL_GROUP)
+        crossed = bool(np.abs(z) >= boundaries[k])
+        if crossed and stopped[group] is None:
+            stopped[group] = k + 1
+
+        i, j = monitor.groups.index(group), monitor.groups.index(CONTROL_GROUP)
+        report_rows.append({
+            "look": k + 1,
+            "info_fraction": info_fractions[k],
+            "n_respondents": size,
+            "ad_group": group,
+            "n_group": monitor.n[i],
+            "n_control": monitor.n[j],
+            "vaccination_rate": monitor.vaccinated[i] / monitor.n[i],
+            "control_rate": monitor.vaccinated[j] / monitor.n[j],
+            "z_statistic": z,
+            "boundary": boundaries[k],
+            "cumulative_alpha_spent": cumulative_alpha[k],
+            "crossed": crossed,
+            "chi2_all_groups": chi2,
+            "chi2_p_value": chi2_p,
+        })
+
+report = pd.DataFrame(report_rows)
+report.to_csv("outputs/sequential_monitoring_looks.csv", index=False)
+
+print("\n📊 Interim Looks:")
+print(report[["look", "n_respondents", "ad_group", "z_statistic", "boundary", "crossed"]])
+
+# ----------------------------------------
+# Boundary-Crossing Report
+# ----------------------------------------
+
+with open("outputs/sequential_monitoring_report.txt", "w") as f:
+    f.write("=== Group-Sequential Monitoring ===\n")
+    f.write(f"Spending function: {SPENDING_FUNCTION}\n")
+    f.write(f"Looks: {N_LOOKS}, overall alpha: {ALPHA}, alpha per comparison: {alpha_per_comparison:.4f}\n")
+    f.write(f"Planned respondents: {n_total}\n\n")
+    for group in TREATMENT_GROUPS:
+        look = stopped[group]
+        if look is None:
+            f.write(f"{group} vs {CONTROL_GROUP}: no boundary crossed; continue to final analysis.\n")
+        else:
+            row = report[(report["look"] == look) & (report["ad_group"] == group)].iloc[0]
+            saved = n_total - int(row["n_respondents"])
+            f.write(
+                f"{group} vs {CONTROL_GROUP}: boundary crossed at look {look} "
+                f"(n = {int(row['n_respondents'])}, z = {row['z_statistic']:.3f}, "
+                f"|z| >= {row['boundary']:.3f}); stopping early saves {saved} respondents "
+                f"({saved / n_total:.0%} of planned follow-up).\n"
+            )
+
+print("\n✅ Sequential monitoring complete. Report saved to outputs/sequential_monitoring_report.txt")